@@ -6,10 +6,6 @@ import { usePathname, useSearchParams } from "next/navigation";
 import { useState, useCallback, useEffect } from "react";
 import { useDropzone, FileRejection } from "react-dropzone";
 import { toast } from "sonner";
-import { PostgrestError } from "@supabase/supabase-js";
-
-// Import your Supabase client
-import { supabase } from "@/lib/client";
 
 // Import the FileUploadCard component
 import FileUploadCard from "@/app/(pages)/modules/[module]/components/fileUploadCard";
@@ -33,6 +29,13 @@ interface ProcessedData {
   };
 }
 
+interface ModuleMeta {
+  module_id: string;
+  name: string;
+  year: string;
+  term: string;
+}
+
 export default function OutlinePage() {
   const searchParams = useSearchParams();
   const pathname = usePathname();
@@ -48,6 +51,8 @@ export default function OutlinePage() {
   const [uploadError, setUploadError] = useState<string | null>(null);
   const [processedContent, setProcessedContent] =
     useState<ProcessedData | null>(null);
+  // Module details from the backend, used when the page is opened without query params
+  const [moduleMeta, setModuleMeta] = useState<ModuleMeta | null>(null);
 
   const [isInitialLoading, setIsInitialLoading] = useState(true);
   const [initialLoadError, setInitialLoadError] = useState<string | null>(null);
@@ -61,32 +66,35 @@ export default function OutlinePage() {
       `[fetchAndSetOutline] Attempting to fetch for moduleId: ${moduleId}`
     );
     try {
-      const { data, error } = await supabase
-        .from("Outlines")
-        .select("content")
-        .eq("module_id", moduleId)
-        .single();
-
-      if (error && error.code !== "PGRST116") {
-        console.error("[fetchAndSetOutline] Error:", error);
-        setInitialLoadError(error.message || "Failed to load outline.");
+      // The browser revalidates with the stored ETag; unchanged outlines come back as 304
+      const response = await fetch(`/api/modules/${moduleId}`, {
+        cache: "no-cache",
+      });
+      const data = await response.json();
+
+      if (!response.ok) {
+        console.error("[fetchAndSetOutline] Error:", data.error);
+        setInitialLoadError(data.error || "Failed to load outline.");
         setProcessedContent(null);
         return null;
       }
 
-      if (data) {
+      setModuleMeta(data.module ?? null);
+
+      if (data.outline) {
         console.log("[fetchAndSetOutline] Data found.");
-        setProcessedContent(data.content as ProcessedData);
+        setProcessedContent(data.outline as ProcessedData);
       } else {
-        // If no matching data is returned (e.g., moduleId not found), explicitly clear processed content to avoid showing stale data.
-        console.log("[fetchAndSetOutline] No data found (PGRST116).");
+        // If no outline exists for this module, explicitly clear processed content to avoid showing stale data.
+        console.log("[fetchAndSetOutline] No data found.");
         setProcessedContent(null);
       }
     } catch (err: unknown) {
-      const supaError = err as PostgrestError;
-      console.error("[fetchAndSetOutline] Unexpected error:", supaError);
+      console.error("[fetchAndSetOutline] Unexpected error:", err);
       setInitialLoadError(
-        supaError?.message ?? "An unexpected error occurred during fetch."
+        err instanceof Error
+          ? err.message
+          : "An unexpected error occurred during fetch."
       );
       setProcessedContent(null);
     } finally {
@@ -215,7 +223,12 @@ export default function OutlinePage() {
   return (
     <main className="min-h-screen p-8 sm:p-20 bg-white text-black dark:bg-[#0a0a0a] dark:text-white">
       <section className="mb-6">
-        <Header moduleId={moduleId} name={name} year={year} term={term} />
+        <Header
+          moduleId={moduleId}
+          name={name ?? moduleMeta?.name ?? null}
+          year={year ?? moduleMeta?.year ?? null}
+          term={term ?? moduleMeta?.term ?? null}
+        />
 
         {isInitialLoading ? (
           <div className="text-center py-12 text-gray-600 dark:text-gray-400">
@@ -24,6 +24,8 @@ export default function TopicPage() {
   const topic = decodeURIComponent(rawTopic);
 
   const [chatHistory, setChatHistory] = useState<ChatMessage[]>([]);
+  // History lives on the backend; only the session id is sent with each message
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const [currentMessage, setCurrentMessage] = useState<string>("");
   const [isSendingMessage, setIsSendingMessage] = useState<boolean>(false);
   const chatEndRef = useRef<HTMLDivElement>(null); 
@@ -168,7 +170,7 @@ export default function TopicPage() {
           message: userMessage.text,
           topic,
           moduleId,
-          chatHistory, 
+          sessionId,
         }),
       });
 
@@ -178,6 +180,9 @@ export default function TopicPage() {
       }
 
       const data = await response.json();
+      if (data.sessionId) {
+        setSessionId(data.sessionId);
+      }
       const aiText = data.answer ?? "🤖 Sorry, I couldn't generate a response.";
       setChatHistory((prev) => [
         ...prev,
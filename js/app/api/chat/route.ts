@@ -3,22 +3,27 @@ import { NextResponse } from "next/server";
 const backendUrl = process.env.FLASK_BACKEND_URL || "http://localhost:8888";
 
 export async function POST(req: Request) {
-  const { message, topic, moduleId, chatHistory } = await req.json();
-  if (!message || !topic || !moduleId || !chatHistory) {
+  const { message, topic, moduleId, sessionId } = await req.json();
+  if (!message || !topic || !moduleId) {
     return NextResponse.json({ error: "Missing parameters" }, { status: 400 });
   }
 
   try {
-    const resp = await fetch(`${backendUrl}/process-chat`, {
+    const resp = await fetch(`${backendUrl}/process-chat?moduleId=${encodeURIComponent(moduleId)}`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ message, topic, moduleId, chatHistory }),
+      body: JSON.stringify({ message, topic, moduleId, sessionId }),
     });
     const data = await resp.json();
     if (!resp.ok) {
-      return NextResponse.json({ error: data.error || "Flask error" }, { status: resp.status });
+      // Keep Retry-After from the backend's 429/503 so the client can back off
+      const retryAfter = resp.headers.get("retry-after");
+      return NextResponse.json(
+        { error: data.error || "Flask error" },
+        { status: resp.status, headers: retryAfter ? { "Retry-After": retryAfter } : {} }
+      );
     }
-    return NextResponse.json({ answer: data.answer });
+    return NextResponse.json({ answer: data.answer, sessionId: data.sessionId });
   } catch (e: any) {
     console.error("Proxy error:", e);
     return NextResponse.json({ error: "Cannot reach Flask backend" }, { status: 502 });
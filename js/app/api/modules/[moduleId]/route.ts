@@ -1,5 +1,17 @@
 import { createClient } from "@/lib/server";
 import { NextResponse } from "next/server";
+import { proxyConditionalGet, invalidateModuleCache } from "@/lib/backend";
+
+// Module metadata + parsed outline, served from the Flask backend's cache
+export async function GET(
+  req: Request,
+  { params }: { params: { moduleId: string } }
+) {
+  return proxyConditionalGet(
+    req,
+    `/modules/${encodeURIComponent(params.moduleId)}`
+  );
+}
 
 export async function DELETE(
   req: Request,
@@ -38,6 +50,8 @@ export async function DELETE(
       // Handle error accordingly
     }
 
+    await invalidateModuleCache(moduleId);
+
     return NextResponse.json(
       { message: "Module deleted successfully" },
       { status: 200 }
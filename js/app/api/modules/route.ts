@@ -1,26 +1,11 @@
 // app/api/modules/route.ts
 import { NextResponse } from "next/server";
 import { createClient } from "@/lib/server";
+import { proxyConditionalGet, invalidateModuleCache } from "@/lib/backend";
 
-export async function GET() {
-  try {
-    const supabase = await createClient();
-
-    const { data: modules, error } = await supabase.from("Modules").select("*");
-
-    if (error) {
-      console.error("Supabase fetch error:", error);
-      return NextResponse.json({ message: error.message }, { status: 500 });
-    }
-
-    return NextResponse.json({ modules });
-  } catch (error) {
-    console.error("Unexpected error:", error);
-    return NextResponse.json(
-      { message: "Internal Server Error" },
-      { status: 500 }
-    );
-  }
+// The module list is served from the Flask backend's cache
+export async function GET(req: Request) {
+  return proxyConditionalGet(req, "/modules");
 }
 
 export async function POST(req: Request) {
@@ -43,6 +28,8 @@ export async function POST(req: Request) {
       return NextResponse.json({ message: error.message }, { status: 500 });
     }
 
+    await invalidateModuleCache(moduleId);
+
     return NextResponse.json(
       { message: "Module added", module: data },
       { status: 201 }
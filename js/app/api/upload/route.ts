@@ -48,12 +48,17 @@ export async function POST(req: NextRequest) {
     flaskFormData.append("moduleId", moduleId);
 
     // --- Make Request to Flask Backend ---
-    const flaskResponse = await fetch(uploadEndpoint, {
-      method: "POST",
-      body: flaskFormData,
-      // You might want to add headers if your Flask app expects them, e.g.,
-      // headers: { 'Content-Type': 'multipart/form-data' } - fetch sets this automatically for FormData
-    });
+    // moduleId also goes in the query string so the backend can admit or
+    // reject the request without reading the upload body
+    const flaskResponse = await fetch(
+      `${uploadEndpoint}?moduleId=${encodeURIComponent(moduleId)}`,
+      {
+        method: "POST",
+        body: flaskFormData,
+        // You might want to add headers if your Flask app expects them, e.g.,
+        // headers: { 'Content-Type': 'multipart/form-data' } - fetch sets this automatically for FormData
+      }
+    );
 
     // --- Handle Flask Backend Response ---
     if (!flaskResponse.ok) {
@@ -91,7 +96,10 @@ export async function POST(req: NextRequest) {
       }
 
       // Return the error response to the client
-      return NextResponse.json(errorResponse, { status });
+      return NextResponse.json(errorResponse, {
+        status,
+        headers: retryAfterHeaders(flaskResponse),
+      });
     }
 
     // --- If Flask Response is OK ---
@@ -113,3 +121,9 @@ export async function POST(req: NextRequest) {
     );
   }
 }
+
+// Forward Retry-After from the backend's 429/503 responses
+function retryAfterHeaders(resp: Response): Record<string, string> {
+  const retryAfter = resp.headers.get("retry-after");
+  return retryAfter ? { "Retry-After": retryAfter } : {};
+}
@@ -46,10 +46,15 @@ export async function POST(req: NextRequest) {
     flaskFormData.append("topic", topic);
 
     // Send to Flask backend
-    const flaskResponse = await fetch(uploadEndpoint, {
-      method: "POST",
-      body: flaskFormData,
-    });
+    // moduleId also goes in the query string so the backend can admit or
+    // reject the request without reading the upload body
+    const flaskResponse = await fetch(
+      `${uploadEndpoint}?moduleId=${encodeURIComponent(moduleId)}`,
+      {
+        method: "POST",
+        body: flaskFormData,
+      }
+    );
 
     if (!flaskResponse.ok) {
       const status = flaskResponse.status;
@@ -69,7 +74,10 @@ export async function POST(req: NextRequest) {
         errorResponse.error = `Flask server error (status: ${status}). Could not parse response.`;
       }
 
-      return NextResponse.json(errorResponse, { status });
+      return NextResponse.json(errorResponse, {
+        status,
+        headers: retryAfterHeaders(flaskResponse),
+      });
     }
 
     const successData = await flaskResponse.json();
@@ -86,4 +94,10 @@ export async function POST(req: NextRequest) {
       { status: 500 }
     );
   }
-}
\ No newline at end of file
+}
+
+// Forward Retry-After from the backend's 429/503 responses
+function retryAfterHeaders(resp: Response): Record<string, string> {
+  const retryAfter = resp.headers.get("retry-after");
+  return retryAfter ? { "Retry-After": retryAfter } : {};
+}
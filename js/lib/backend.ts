@@ -0,0 +1,65 @@
+import { NextResponse } from "next/server";
+
+export const backendUrl =
+  process.env.FLASK_BACKEND_URL || "http://localhost:8888";
+
+// Proxy a cached GET from the Flask backend. Conditional request headers are
+// passed through so unchanged data comes back as a bodiless 304.
+export async function proxyConditionalGet(req: Request, path: string) {
+  const headers: Record<string, string> = {};
+  for (const name of ["if-none-match", "if-modified-since"]) {
+    const value = req.headers.get(name);
+    if (value) headers[name] = value;
+  }
+
+  try {
+    const resp = await fetch(`${backendUrl}${path}`, {
+      headers,
+      cache: "no-store",
+    });
+
+    const passthrough = new Headers();
+    for (const name of ["etag", "last-modified", "cache-control"]) {
+      const value = resp.headers.get(name);
+      if (value) passthrough.set(name, value);
+    }
+
+    if (resp.status === 304) {
+      return new NextResponse(null, { status: 304, headers: passthrough });
+    }
+    const data = await resp.json();
+    if (!resp.ok) {
+      return NextResponse.json(
+        { error: data.error || "Flask error" },
+        { status: resp.status }
+      );
+    }
+    return NextResponse.json(data, { headers: passthrough });
+  } catch (error) {
+    console.error("Proxy error:", error);
+    return NextResponse.json(
+      { error: "Cannot reach Flask backend" },
+      { status: 502 }
+    );
+  }
+}
+
+// Tell the backend a module changed so its cached list and outline are dropped.
+// This only clears the cache of the backend worker that handles the call; other
+// workers keep serving their copy until the backend's TTL expires. Failures are
+// logged only. Requires CACHE_INVALIDATE_TOKEN to match the backend's.
+export async function invalidateModuleCache(moduleId: string) {
+  const token = process.env.CACHE_INVALIDATE_TOKEN;
+  if (!token) return;
+  try {
+    const resp = await fetch(
+      `${backendUrl}/modules/${encodeURIComponent(moduleId)}/invalidate`,
+      { method: "POST", headers: { Authorization: `Bearer ${token}` } }
+    );
+    if (!resp.ok) {
+      console.error("Backend rejected module cache invalidation:", resp.status);
+    }
+  } catch (error) {
+    console.error("Failed to invalidate backend module cache:", error);
+  }
+}
@@ -0,0 +1,206 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from functools import wraps
+
+from flask import request, jsonify
+
+# Per-module queue depth is exported for the deepest queues only; the rest are summed as "other"
+METRICS_MAX_MODULES = int(os.getenv("METRICS_MAX_MODULES", 10))
+
+
+def _label(value: str) -> str:
+    # Escaping per the Prometheus text exposition format
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, pool: str, status: int, reason: str, retry_after: int):
+        super().__init__(f"{pool} pool rejected request: {reason}")
+        self.pool = pool
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionPool:
+    """
+    Bounded concurrency pool with per-module fair queuing.
+
+    Up to max_concurrent requests run at once. Further requests wait in a queue
+    per module, and freed slots are handed out round-robin across modules so one
+    module's burst cannot starve the others. Requests are rejected straight away
+    when the module's queue (429) or the whole queue (503) is full, or with 503
+    when they wait longer than queue_timeout seconds.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int,
+                 max_queue_per_module: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_module = max_queue_per_module
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queues = {}          # module_id -> deque of waiting tickets
+        self._turns = deque()      # round-robin order of modules with waiters
+        self._granted = set()
+        self._avg_service_time = 1.0
+
+        self.admitted_total = 0
+        self.rejected_total = {"queue_full": 0, "module_queue_full": 0, "queue_timeout": 0}
+
+    # --- Queue state ---
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _retry_after(self) -> int:
+        # Rough time until a queued request would reach a free slot
+        backlog = self.queue_depth() + 1
+        return max(1, math.ceil(self._avg_service_time * backlog / self.max_concurrent))
+
+    def _reject(self, status, reason):
+        self.rejected_total[reason] += 1
+        raise AdmissionRejected(self.name, status, reason, self._retry_after())
+
+    # --- Acquire / release ---
+    def acquire(self, module_id: str) -> None:
+        with self._cond:
+            if self._active < self.max_concurrent and not self._turns:
+                self._active += 1
+                self.admitted_total += 1
+                return
+
+            module_queue = self._queues.get(module_id)
+            if module_queue and len(module_queue) >= self.max_queue_per_module:
+                self._reject(429, "module_queue_full")
+            if self.queue_depth() >= self.max_queue:
+                self._reject(503, "queue_full")
+
+            ticket = object()
+            if module_queue is None:
+                module_queue = self._queues[module_id] = deque()
+                self._turns.append(module_id)
+            module_queue.append(ticket)
+
+            deadline = time.monotonic() + self.queue_timeout
+            while ticket not in self._granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove_waiter(module_id, ticket)
+                    self._reject(503, "queue_timeout")
+                self._cond.wait(remaining)
+
+            self._granted.discard(ticket)
+            self.admitted_total += 1
+
+    def release(self, service_time: float) -> None:
+        with self._cond:
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * service_time
+            self._active -= 1
+            self._grant_next()
+
+    def _grant_next(self):
+        while self._turns and self._active < self.max_concurrent:
+            module_id = self._turns.popleft()
+            module_queue = self._queues[module_id]
+            self._granted.add(module_queue.popleft())
+            self._active += 1
+            if module_queue:
+                self._turns.append(module_id)
+            else:
+                del self._queues[module_id]
+            self._cond.notify_all()
+
+    def _remove_waiter(self, module_id, ticket):
+        module_queue = self._queues[module_id]
+        module_queue.remove(ticket)
+        if not module_queue:
+            del self._queues[module_id]
+            self._turns.remove(module_id)
+
+    # --- Metrics ---
+    def metrics(self) -> list[str]:
+        with self._cond:
+            lines = [
+                f'admission_active{{pool="{self.name}"}} {self._active}',
+                f'admission_max_concurrent{{pool="{self.name}"}} {self.max_concurrent}',
+                f'admission_queue_depth{{pool="{self.name}"}} {self.queue_depth()}',
+                f'admission_admitted_total{{pool="{self.name}"}} {self.admitted_total}',
+            ]
+            depths = sorted(
+                ((module_id, len(q)) for module_id, q in self._queues.items()),
+                key=lambda item: item[1],
+                reverse=True,
+            )
+            for module_id, depth in depths[:METRICS_MAX_MODULES]:
+                lines.append(
+                    f'admission_module_queue_depth{{pool="{self.name}",module="{_label(module_id)}"}} {depth}'
+                )
+            other = sum(depth for _, depth in depths[METRICS_MAX_MODULES:])
+            if other:
+                lines.append(f'admission_module_queue_depth{{pool="{self.name}",module="other"}} {other}')
+            for reason, count in self.rejected_total.items():
+                lines.append(f'admission_rejected_total{{pool="{self.name}",reason="{reason}"}} {count}')
+            return lines
+
+
+def _pool_from_env(name: str, max_concurrent: int, max_queue: int) -> AdmissionPool:
+    prefix = f"{name.upper()}_"
+    max_queue = int(os.getenv(prefix + "MAX_QUEUE", max_queue))
+    return AdmissionPool(
+        name,
+        max_concurrent=int(os.getenv(prefix + "MAX_CONCURRENT", max_concurrent)),
+        max_queue=max_queue,
+        max_queue_per_module=int(os.getenv(prefix + "MAX_QUEUE_PER_MODULE", max(1, max_queue // 4))),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT", 10)),
+    )
+
+
+# Chat is latency sensitive; ingestion (PDF parsing, embeddings) is CPU heavy
+pools = {
+    "chat": _pool_from_env("chat", max_concurrent=8, max_queue=32),
+    "ingest": _pool_from_env("ingest", max_concurrent=2, max_queue=8),
+}
+
+
+def _request_module_id() -> str:
+    # Taken from the query string (set by the Next.js proxies) or a header, never the
+    # body, so a saturated pool rejects an upload without reading it
+    module_id = request.args.get("moduleId") or request.headers.get("X-Module-Id")
+    return module_id or "unknown"
+
+
+def admit(pool_name: str):
+    """Route decorator that runs the view inside the named admission pool."""
+    pool = pools[pool_name]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                pool.acquire(_request_module_id())
+            except AdmissionRejected as e:
+                response = jsonify({"error": "Server is busy, please retry later", "reason": e.reason})
+                response.status_code = e.status
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response
+
+            started = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                pool.release(time.monotonic() - started)
+        return wrapper
+    return decorator
+
+
+def metrics_text() -> str:
+    lines = []
+    for pool in pools.values():
+        lines.extend(pool.metrics())
+    return "\n".join(lines) + "\n"
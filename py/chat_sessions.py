@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# --- Session stores ---
+# A session is a dict of the form:
+#   {"topic": ..., "module_id": ..., "summary": "...", "summary_version": 0,
+#    "messages": [{"role": ..., "text": ...}]}
+# "messages" only holds the turns that have not been folded into "summary" yet.
+# "summary_version" increases with every fold, so a fold computed from an older
+# read of the session is rejected instead of dropping unsummarized turns.
+# Sessions idle for longer than CHAT_SESSION_TTL seconds are expired.
+
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", 6 * 60 * 60))
+PRUNE_INTERVAL = 60
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def get(self, session_id: str) -> dict | None:
+        """Return the session and mark it as used, or None if it is unknown or expired."""
+
+    @abstractmethod
+    def create(self, session_id: str, topic: str, module_id: str) -> dict:
+        pass
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: list[dict]) -> None:
+        pass
+
+    @abstractmethod
+    def fold_summary(self, session_id: str, summary: str, folded_count: int, expected_version: int) -> bool:
+        """
+        Replace the running summary and drop the first folded_count messages,
+        which are now covered by it. Messages appended after the summary was
+        started are kept.
+
+        Only applies if the session's summary_version still equals
+        expected_version (the version read before summarizing); returns whether
+        the fold was applied.
+        """
+
+    @abstractmethod
+    def prune_expired(self) -> None:
+        pass
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Sessions held in this process only. With several server workers a session id
+    is unknown to the other workers, which silently start a fresh session; use the
+    SQLite store (single host) when running more than one worker.
+    """
+
+    def __init__(self, ttl: float = CHAT_SESSION_TTL):
+        self._ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def get(self, session_id):
+        self._maybe_prune()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if now - session["last_seen"] > self._ttl:
+                del self._sessions[session_id]
+                return None
+            session["last_seen"] = now
+            return {
+                "topic": session["topic"],
+                "module_id": session["module_id"],
+                "summary": session["summary"],
+                "summary_version": session["summary_version"],
+                "messages": list(session["messages"]),
+            }
+
+    def create(self, session_id, topic, module_id):
+        session = {"topic": topic, "module_id": module_id, "summary": "", "summary_version": 0, "messages": []}
+        with self._lock:
+            self._sessions[session_id] = {**session, "messages": [], "last_seen": time.monotonic()}
+        return session
+
+    def append_messages(self, session_id, messages):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session["messages"].extend(messages)
+                session["last_seen"] = time.monotonic()
+
+    def fold_summary(self, session_id, summary, folded_count, expected_version):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session["summary_version"] != expected_version:
+                return False
+            session["summary"] = summary
+            session["summary_version"] += 1
+            del session["messages"][:folded_count]
+            return True
+
+    def prune_expired(self):
+        cutoff = time.monotonic() - self._ttl
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if s["last_seen"] < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+            self._last_prune = time.monotonic()
+
+    def _maybe_prune(self):
+        if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune_expired()
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite file, which several worker processes on one host can share.
+    Read-modify-write updates run inside BEGIN IMMEDIATE transactions so they are
+    atomic across processes, not just threads.
+    """
+
+    def __init__(self, path: str, ttl: float = CHAT_SESSION_TTL):
+        self._path = path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        # Autocommit mode; transactions are opened explicitly in _transaction()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                module_id TEXT NOT NULL,
+                summary TEXT NOT NULL DEFAULT '',
+                summary_version INTEGER NOT NULL DEFAULT 0,
+                messages TEXT NOT NULL DEFAULT '[]',
+                last_seen REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Databases created before these columns existed
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chat_sessions)")}
+        if "summary_version" not in columns:
+            self._conn.execute("ALTER TABLE chat_sessions ADD COLUMN summary_version INTEGER NOT NULL DEFAULT 0")
+        if "last_seen" not in columns:
+            self._conn.execute("ALTER TABLE chat_sessions ADD COLUMN last_seen REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chat_sessions_last_seen ON chat_sessions (last_seen)")
+
+    @contextmanager
+    def _transaction(self):
+        # The thread lock serializes use of the shared connection; BEGIN IMMEDIATE
+        # takes SQLite's write lock so other processes can't interleave
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, session_id):
+        self._maybe_prune()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT topic, module_id, summary, summary_version, messages FROM chat_sessions "
+                "WHERE session_id = ? AND last_seen >= ?",
+                (session_id, time.time() - self._ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE chat_sessions SET last_seen = ? WHERE session_id = ?", (time.time(), session_id))
+        topic, module_id, summary, summary_version, messages = row
+        return {
+            "topic": topic,
+            "module_id": module_id,
+            "summary": summary,
+            "summary_version": summary_version,
+            "messages": json.loads(messages),
+        }
+
+    def create(self, session_id, topic, module_id):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, topic, module_id, last_seen) VALUES (?, ?, ?, ?)",
+                (session_id, topic, module_id, time.time()),
+            )
+        return {"topic": topic, "module_id": module_id, "summary": "", "summary_version": 0, "messages": []}
+
+    def append_messages(self, session_id, messages):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT messages FROM chat_sessions WHERE session_id = ? AND last_seen >= ?",
+                (session_id, time.time() - self._ttl),
+            ).fetchone()
+            if row is None:
+                return
+            updated = json.loads(row[0]) + messages
+            conn.execute(
+                "UPDATE chat_sessions SET messages = ?, last_seen = ? WHERE session_id = ?",
+                (json.dumps(updated), time.time(), session_id),
+            )
+
+    def fold_summary(self, session_id, summary, folded_count, expected_version):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT messages FROM chat_sessions WHERE session_id = ? AND summary_version = ? AND last_seen >= ?",
+                (session_id, expected_version, time.time() - self._ttl),
+            ).fetchone()
+            if row is None:
+                return False
+            remaining = json.loads(row[0])[folded_count:]
+            conn.execute(
+                "UPDATE chat_sessions SET summary = ?, summary_version = summary_version + 1, messages = ? "
+                "WHERE session_id = ?",
+                (summary, json.dumps(remaining), session_id),
+            )
+            return True
+
+    def prune_expired(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM chat_sessions WHERE last_seen < ?", (time.time() - self._ttl,))
+        self._last_prune = time.monotonic()
+
+    def _maybe_prune(self):
+        if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune_expired()
+
+
+def create_session_store() -> SessionStore:
+    # CHAT_SESSION_STORE=memory (default, per process) or sqlite (shared by workers on one host)
+    backend = os.getenv("CHAT_SESSION_STORE", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("CHAT_SESSION_DB", "./chat_sessions.db"))
+    if backend == "memory":
+        return InMemorySessionStore()
+    raise ValueError(f"Unknown CHAT_SESSION_STORE backend: {backend}")
+
+
+# --- Background summarization ---
+
+class HistorySummarizer:
+    """
+    Folds older turns of a session into its running summary on a background thread.
+
+    summarize_fn(previous_summary, messages) -> str is called with the turns that
+    fell out of the recent window. At most one summarization runs per session in
+    this process; across processes, the store's summary_version check discards a
+    fold based on an outdated read.
+    """
+
+    def __init__(self, store: SessionStore, summarize_fn, max_workers: int = 2):
+        self._store = store
+        self._summarize_fn = summarize_fn
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, session_id: str, keep_messages: int) -> None:
+        with self._lock:
+            if session_id in self._in_flight:
+                return
+            self._in_flight.add(session_id)
+        self._executor.submit(self._run, session_id, keep_messages)
+
+    def _run(self, session_id, keep_messages):
+        try:
+            session = self._store.get(session_id)
+            if session is None:
+                return
+            overflow = len(session["messages"]) - keep_messages
+            if overflow <= 0:
+                return
+            older = session["messages"][:overflow]
+            summary = self._summarize_fn(session["summary"], older)
+            if not self._store.fold_summary(session_id, summary, overflow, session["summary_version"]):
+                # Another worker folded this session first; the turns are picked up next time
+                logger.info("Skipped stale summary for chat session %s", session_id)
+        except Exception as e:
+            # The turns stay in "messages" and are retried on the next schedule.
+            logger.error("Failed to summarize chat session %s: %s", session_id, e, exc_info=True)
+        finally:
+            with self._lock:
+                self._in_flight.discard(session_id)
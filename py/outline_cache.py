@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from supabasedb import supabase
+
+# Outlines are written by /process-outline and modules by the Next.js API routes;
+# both invalidate their entries, but only in the worker that handles the request.
+# The TTL bounds staleness in the other workers and for changes made directly in
+# Supabase.
+OUTLINE_CACHE_TTL = float(os.getenv("OUTLINE_CACHE_TTL", 300))
+OUTLINE_CACHE_MAX_ENTRIES = int(os.getenv("OUTLINE_CACHE_MAX_ENTRIES", 512))
+
+MODULE_LIST_KEY = "modules"
+
+
+def fetch_module_outline(module_id: str) -> dict | None:
+    modules = (
+        supabase.table("Modules").select("*").eq("module_id", module_id).limit(1).execute()
+    ).data
+    if not modules:
+        return None
+    # Re-uploading an outline inserts a new row; the newest one wins
+    outlines = (
+        supabase.table("Outlines")
+        .select("content")
+        .eq("module_id", module_id)
+        .order("created_at", desc=True)
+        .limit(1)
+        .execute()
+    ).data
+    return {
+        "module": modules[0],
+        "outline": outlines[0]["content"] if outlines else None,
+    }
+
+
+def fetch_modules(_key=None) -> dict:
+    return {"modules": supabase.table("Modules").select("*").execute().data}
+
+
+class OutlineCache:
+    """
+    In-process LRU cache of serialized JSON payloads, keyed by module id
+    (or MODULE_LIST_KEY for the module list).
+
+    Each entry is {"body": bytes, "etag": str, "last_modified": datetime, "loaded_at": float}.
+    Concurrent misses for the same key share a single database load. A loader
+    returning None (e.g. unknown module) is not cached.
+
+    The cache is per process: invalidate() only drops the entry in the worker it
+    runs in, so with several workers the others may serve the old payload until
+    its TTL expires.
+    """
+
+    def __init__(self, loader=fetch_module_outline, ttl: float = OUTLINE_CACHE_TTL,
+                 max_entries: int = OUTLINE_CACHE_MAX_ENTRIES):
+        self._loader = loader
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._loads = {}           # key -> {"lock": Lock, "invalidated": bool} while a load is in flight
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        entry = self._fresh_entry(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            load = self._loads.setdefault(key, {"lock": threading.Lock(), "invalidated": False})
+        try:
+            with load["lock"]:
+                # Another request may have loaded it while we waited
+                entry = self._fresh_entry(key)
+                if entry is not None:
+                    return entry
+                return self._load(key, load)
+        finally:
+            with self._lock:
+                if self._loads.get(key) is load:
+                    del self._loads[key]
+
+    def _load(self, key, load):
+        data = self._loader(key)
+        if data is None:
+            return None
+
+        body = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            previous = self._entries.get(key)
+            # Reloading unchanged data (e.g. after TTL expiry) keeps the original Last-Modified
+            if previous is not None and previous["etag"] == etag:
+                last_modified = previous["last_modified"]
+            else:
+                last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            entry = {
+                "body": body,
+                "etag": etag,
+                "last_modified": last_modified,
+                "loaded_at": time.monotonic(),
+            }
+            # Don't store data read before an invalidate() that raced with this load
+            if not load["invalidated"]:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            load = self._loads.get(key)
+            if load is not None:
+                load["invalidated"] = True
+
+    def _fresh_entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            # Expired entries stay (within the LRU bound) so a reload can reuse Last-Modified
+            if time.monotonic() - entry["loaded_at"] >= self._ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry
@@ -6,22 +6,157 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_groq import ChatGroq
 from supabasedb import supabase
 import os
+import time
+import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from groq import Groq
 
 client = Groq(api_key=os.environ["GROQ_API_KEY"])
+logger = logging.getLogger(__name__)
 
 
-def process_chat(message, topic, module_id, chat_history) -> str:
-    # 1. context from hybrid search
-    docs = hybrid_search(message, topic, module_id, match_count=5) or []
+MAX_RECENT_PAIRS = 5
+
+# --- Per-stage time budgets (seconds) ---
+# A slow search only lowers context quality; it never holds up the answer past its budget.
+RETRIEVAL_TIMEOUT = float(os.getenv("CHAT_RETRIEVAL_TIMEOUT", 2.0))
+KEYWORD_FALLBACK_AFTER = float(os.getenv("CHAT_KEYWORD_FALLBACK_AFTER", 1.0))
+LLM_TIMEOUT = float(os.getenv("CHAT_LLM_TIMEOUT", 30.0))
+
+# Set up by init_retrieval(); server.py sizes it from the chat admission pool
+retrieval_executor = None
+_wrap_task = None
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings() -> HuggingFaceEmbeddings:
+    # Loading the model takes seconds, so it is done once per process
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = HuggingFaceEmbeddings(
+                model_name="sentence-transformers/all-MiniLM-L6-v2",
+                model_kwargs={"device": "cpu"},
+                encode_kwargs={"normalize_embeddings": True},
+            )
+        return _embeddings
+
+
+def init_retrieval(max_workers: int, wrap_task=None):
+    """
+    Create the executor the searches run on.
+
+    Size it for two searches per concurrent chat request plus room for one round of
+    searches that overran their deadline and are still running; searches that
+    haven't started by the deadline are cancelled, so stale work can't pile up.
+    wrap_task(fn) -> fn, if given, wraps each search before it is submitted (e.g.
+    so a profiled request's profile includes it).
+    """
+    global retrieval_executor, _wrap_task
+    retrieval_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+    _wrap_task = wrap_task
+
+
+def warm_up():
+    """Load the embedder in the background so the first chat request doesn't pay for it."""
+    retrieval_executor.submit(get_embeddings)
+
+
+@lru_cache(maxsize=1024)
+def embed_query(message: str) -> tuple:
+    return tuple(get_embeddings().embed_query(message))
+
+
+def start_retrieval(message, topic, module_id, match_count=5) -> dict:
+    """
+    Start the hybrid (vector + keyword) search and a keyword-only search concurrently.
+
+    Call this as early as possible in the request; collect_context() gathers the results.
+    """
+    wrap = _wrap_task or (lambda fn: fn)
+    return {
+        "started": time.monotonic(),
+        "match_count": match_count,
+        "hybrid": retrieval_executor.submit(wrap(hybrid_search), message, topic, module_id, match_count),
+        "keyword": retrieval_executor.submit(wrap(keyword_search), message, topic, module_id, match_count),
+    }
+
+
+def collect_context(retrieval: dict) -> list[dict]:
+    """
+    Wait for the searches started by start_retrieval() within RETRIEVAL_TIMEOUT.
+
+    Returns as soon as the hybrid search succeeds with match_count results. If it
+    fails or comes back short, keyword results fill in; once KEYWORD_FALLBACK_AFTER
+    has passed, enough keyword results are used without waiting for hybrid. At the
+    deadline whatever has arrived is used, and searches that haven't started yet
+    are cancelled.
+    """
+    hybrid, keyword = retrieval["hybrid"], retrieval["keyword"]
+    match_count = retrieval["match_count"]
+    deadline = retrieval["started"] + RETRIEVAL_TIMEOUT
+    fallback_at = retrieval["started"] + KEYWORD_FALLBACK_AFTER
+    results = {}
+
+    while True:
+        for name, future in (("hybrid", hybrid), ("keyword", keyword)):
+            if name not in results and future.done():
+                results[name] = _search_result(future)
+
+        if len(results.get("hybrid", [])) >= match_count or len(results) == 2:
+            break
+        now = time.monotonic()
+        if now >= deadline:
+            logger.warning("Retrieval deadline of %.1fs passed; using partial context", RETRIEVAL_TIMEOUT)
+            break
+        if now >= fallback_at and len(results.get("keyword", [])) >= match_count:
+            logger.info("Hybrid search slow or short; using keyword results")
+            break
+
+        pending = [f for f in (hybrid, keyword) if not f.done()]
+        wake_at = deadline if now >= fallback_at else fallback_at
+        wait(pending, timeout=wake_at - now, return_when=FIRST_COMPLETED)
+
+    # Frees the workers for other requests; searches already running can't be stopped
+    hybrid.cancel()
+    keyword.cancel()
+
+    # Hybrid results first, then keyword results not already included
+    docs, seen = [], set()
+    for d in results.get("hybrid", []) + results.get("keyword", []):
+        if d["chunk"] not in seen:
+            seen.add(d["chunk"])
+            docs.append(d)
+    return docs[:match_count]
+
+
+def _search_result(future) -> list[dict]:
+    try:
+        return future.result() or []
+    except Exception as e:
+        logger.error("Search failed: %s", e, exc_info=True)
+        return []
+
+
+def process_chat(message, topic, module_id, session, retrieval=None) -> str:
+    # 1. context from the searches started by the route (or start them now)
+    if retrieval is None:
+        retrieval = start_retrieval(message, topic, module_id, match_count=5)
+    docs = collect_context(retrieval)
     chunks = [d["chunk"] for d in docs]
     context = "\n\n---\n\n".join(chunks)
 
-    # 2. build messages only with "content"
-    trimmed = trim_history(chat_history, max_pairs=5)
+    # 2. build messages: running summary + recent turns only
+    trimmed = trim_history(session["messages"], max_pairs=MAX_RECENT_PAIRS)
     messages = [
         {"role": "system", "content": f"You are an AI assistant. Use this context:\n{context}"}
     ]
+    if session.get("summary"):
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{session['summary']}"})
     for m in trimmed:
         messages.append({"role": m["role"], "content": m["text"]})
     messages.append({"role": "user", "content": message})
@@ -29,13 +164,33 @@ def process_chat(message, topic, module_id, chat_history) -> str:
     # 3. call the API
     chat_completion = client.chat.completions.create(
         model="llama-3.3-70b-versatile",
-        messages=messages
+        messages=messages,
+        timeout=LLM_TIMEOUT,
     )
     return chat_completion.choices[0].message.content
 
-    # 3. Call Groq Chat Completions API
+
+def summarize_history(previous_summary: str, messages: list[dict]) -> str:
+    """
+    Fold older chat turns into the running conversation summary.
+
+    :param previous_summary: the summary built so far (may be empty)
+    :param messages: a list of {"role": ..., "text": ...} turns to fold in
+    :return: the updated summary
+    """
+    transcript = "\n".join(f"{m['role']}: {m['text']}" for m in messages)
+    prompt = (
+        "Update the summary of a tutoring conversation with the new turns below. "
+        "Keep facts, questions asked and answers given; be concise.\n\n"
+        f"Current summary:\n{previous_summary or '(none)'}\n\n"
+        f"New turns:\n{transcript}"
+    )
     chat_completion = client.chat.completions.create(
-        model="llama-3.3-70b-versatile", messages=messages
+        model="llama-3.1-8b-instant",
+        messages=[
+            {"role": "system", "content": "You summarize conversations."},
+            {"role": "user", "content": prompt},
+        ],
     )
     return chat_completion.choices[0].message.content
 
@@ -93,12 +248,7 @@ def trim_history(chat_history: list[dict], max_pairs=5):
 
 
 def hybrid_search(message, topic, module_id, match_count=10):
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={"device": "cpu"},
-        encode_kwargs={"normalize_embeddings": True},
-    )
-    vector = embeddings.embed_query(message)
+    vector = list(embed_query(message))
 
     response = (
         supabase.rpc(
@@ -116,3 +266,17 @@ def hybrid_search(message, topic, module_id, match_count=10):
 
     return response.data
 
+
+def keyword_search(message, topic, module_id, match_count=10):
+    # Full-text only: needs no embedding, so it usually returns before hybrid_search
+    response = (
+        supabase.table("Slidechunks")
+        .select("chunk")
+        .text_search("chunk", message, options={"type": "websearch", "config": "english"})
+        .eq("topic", topic)
+        .eq("module_id", module_id)
+        .limit(match_count)
+        .execute()
+    )
+
+    return response.data
@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import time
+import uuid
+import hmac
+import random
+import logging
+import threading
+from functools import wraps
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import request, g
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# PROFILE_SAMPLE_RATE=0.01 profiles 1% of requests; 0 (default) only profiles
+# requests sent with an "X-Profile" header matching PROFILE_TOKEN.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.01))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 20))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles/")
+MAX_STACK_DEPTH = 128
+
+
+class StackSampler:
+    """
+    Statistical profiler for request threads.
+
+    A single background thread wakes every `interval` seconds and records the
+    current stack of each thread being profiled. Threads that are not profiled
+    cost nothing, and the sampler sleeps while no thread is profiled.
+
+    Work a profiled request hands to an executor is only sampled if it was
+    submitted through propagate(); it is recorded under a "[<thread pool>]" root
+    frame. Work that outlives the request (e.g. chat history summarization, or a
+    search that overran its deadline) is not part of the profile.
+    """
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._tracked = {}         # thread id -> (profile Counter, root label or None)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id: int) -> Counter:
+        counts = Counter()
+        self.attach(thread_id, counts)
+        return counts
+
+    def attach(self, thread_id: int, counts: Counter, label: str | None = None) -> None:
+        with self._lock:
+            self._tracked[thread_id] = (counts, label)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def detach(self, thread_id: int, counts: Counter) -> None:
+        with self._lock:
+            tracked = self._tracked.get(thread_id)
+            if tracked is not None and tracked[0] is counts:
+                del self._tracked[thread_id]
+
+    def stop(self, counts: Counter) -> Counter:
+        """Stop sampling every thread attached to this profile and return a snapshot of it."""
+        with self._lock:
+            for thread_id in [t for t, (c, _) in self._tracked.items() if c is counts]:
+                del self._tracked[thread_id]
+            return Counter(counts)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self._interval)
+            with self._lock:
+                if not self._tracked:
+                    self._wake.clear()
+                    continue
+                frames = sys._current_frames()
+                for thread_id, (counts, label) in self._tracked.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = _collapse(frame)
+                        counts[f"[{label}];{stack}" if label else stack] += 1
+
+
+def _collapse(frame) -> str:
+    # Collapsed-stack format: outermost frame first, frames separated by ";"
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _route_slug(rule: str) -> str:
+    return re.sub(r"[^\w\-]+", "_", rule).strip("_") or "root"
+
+
+sampler = StackSampler(PROFILE_INTERVAL)
+# Profile of the request being handled on this thread, if it is sampled
+_local = threading.local()
+# Profiles are written off the request path
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-writer")
+
+
+def token_matches(value: str | None) -> bool:
+    # Constant-time comparison; always False when no PROFILE_TOKEN is configured
+    if not PROFILE_TOKEN or not value:
+        return False
+    return hmac.compare_digest(value.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+def propagate(fn):
+    """
+    Wrap fn, before submitting it to an executor, so that it is sampled into the
+    calling request's profile. Returns fn unchanged when the request isn't profiled.
+    """
+    counts = getattr(_local, "counts", None)
+    if counts is None:
+        return fn
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        thread_id = threading.get_ident()
+        # ThreadPoolExecutor names workers "<prefix>_<n>"; group them by prefix
+        label = re.sub(r"_\d+$", "", threading.current_thread().name)
+        sampler.attach(thread_id, counts, label)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sampler.detach(thread_id, counts)
+    return run
+
+
+def _should_profile() -> bool:
+    if token_matches(request.headers.get("X-Profile")):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _write_profile(route: str, started: float, duration: float, counts: Counter) -> None:
+    try:
+        route_dir = os.path.join(PROFILE_DIR, route)
+        os.makedirs(route_dir, exist_ok=True)
+
+        name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(started))}_{int(duration * 1000)}ms_{uuid.uuid4().hex[:8]}.collapsed"
+        with open(os.path.join(route_dir, name), "w") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # Keep only the newest PROFILE_KEEP profiles for this route
+        profiles = sorted(os.listdir(route_dir))
+        for old in profiles[:-PROFILE_KEEP]:
+            try:
+                os.remove(os.path.join(route_dir, old))
+            except FileNotFoundError:
+                pass  # Already pruned by another worker process
+    except Exception as e:
+        # Runs on the writer thread, where an exception would otherwise vanish
+        logger.error("Failed to write profile for %s: %s", route, e, exc_info=True)
+
+
+def init_app(app) -> None:
+    """Register request hooks that profile sampled requests."""
+
+    @app.before_request
+    def _start_profile():
+        if not _should_profile():
+            return
+        g.profile_started = time.time()
+        g.profile_counts = _local.counts = sampler.start(threading.get_ident())
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        profile = g.pop("profile_counts", None)
+        if profile is None:
+            return
+        _local.counts = None
+        counts = sampler.stop(profile)
+        started = g.pop("profile_started")
+        if not counts:
+            return
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        _writer.submit(_write_profile, _route_slug(rule), started, time.time() - started, counts)
+
+
+# --- Stored profiles ---
+
+def list_profiles() -> dict:
+    if not os.path.isdir(PROFILE_DIR):
+        return {}
+    return {
+        route: sorted(os.listdir(os.path.join(PROFILE_DIR, route)), reverse=True)
+        for route in sorted(os.listdir(PROFILE_DIR))
+        if os.path.isdir(os.path.join(PROFILE_DIR, route))
+    }
+
+
+def profile_path(route: str, name: str) -> str | None:
+    # Only names produced by list_profiles() are accepted, which rules out path traversal
+    if name not in list_profiles().get(route, []):
+        return None
+    return os.path.join(PROFILE_DIR, route, name)
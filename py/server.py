@@ -1,6 +1,9 @@
-from flask import Flask, request, jsonify, Response, stream_with_context
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 import os
+import hmac
+import uuid
 import logging
 
 # Assuming these imports set up your Supabase client correctly
@@ -8,22 +11,55 @@ from supabasedb import supabase
 from process_outline import process_outline
 from upload_data_supabase import upload_data_supabase
 from process_ppt import process_ppt
-from process_chat import process_chat
+from process_chat import process_chat, summarize_history, start_retrieval, init_retrieval, warm_up, MAX_RECENT_PAIRS
+from chat_sessions import create_session_store, HistorySummarizer
+from admission import admit, metrics_text, pools
+from outline_cache import OutlineCache, fetch_modules, MODULE_LIST_KEY
+import profiler
 
 
 app = Flask(__name__)
 CORS(app)
+# Uploads are capped at 10MB; leave headroom for the multipart envelope
+MAX_FILE_SIZE_MB = 10
+app.config["MAX_CONTENT_LENGTH"] = (MAX_FILE_SIZE_MB + 1) * 1024 * 1024
+profiler.init_app(app)
 
 logging.basicConfig(level=logging.INFO)
 app.logger.setLevel(logging.INFO)
 
 LOCAL_UPLOAD_FOLDER = './downloads/'
+# Shared with the Next.js API routes; cache invalidation is disabled when unset
+CACHE_INVALIDATE_TOKEN = os.getenv("CACHE_INVALIDATE_TOKEN")
+
+session_store = create_session_store()
+history_summarizer = HistorySummarizer(session_store, summarize_history)
+# Two searches per admitted chat request, plus room for one round that overran its deadline
+init_retrieval(4 * pools["chat"].max_concurrent, wrap_task=profiler.propagate)
+warm_up()
+outline_cache = OutlineCache()
+module_list_cache = OutlineCache(loader=fetch_modules)
 
 if not os.path.exists(LOCAL_UPLOAD_FOLDER):
     os.makedirs(LOCAL_UPLOAD_FOLDER)
     app.logger.info(f"Ensured local upload folder exists: {LOCAL_UPLOAD_FOLDER}")
 
+@app.before_request
+def reject_oversized_upload():
+    # Runs before admission and before the body is read, so oversized uploads get a fast 413
+    if request.content_length and request.content_length > app.config["MAX_CONTENT_LENGTH"]:
+        app.logger.warning("Request body of %s bytes exceeds limit.", request.content_length)
+        return jsonify({"error": f"File size exceeds {MAX_FILE_SIZE_MB}MB limit."}), 413
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    # Bodies without a Content-Length are only caught while being read
+    return jsonify({"error": f"File size exceeds {MAX_FILE_SIZE_MB}MB limit."}), 413
+
+
 @app.route("/process-outline", methods=["POST"])
+@admit("ingest")
 def upload_outline_to_storage():
     processed_data = None
     db_upload_success = False
@@ -52,12 +88,7 @@ def upload_outline_to_storage():
             return jsonify({"error": "Only PDF files are allowed"}), 400
 
         # --- 2. File Size Validation ---
-        MAX_FILE_SIZE_MB = 10
-        MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
-
-        if file.content_length > MAX_FILE_SIZE_BYTES:
-            app.logger.warning("File size %s bytes exceeds limit of %s bytes.", file.content_length, MAX_FILE_SIZE_BYTES)
-            return jsonify({"error": f"File size exceeds {MAX_FILE_SIZE_MB}MB limit."}), 413
+        # Enforced for the whole request by MAX_CONTENT_LENGTH (see reject_oversized_upload)
 
         # --- 3. Generate Safe Filename for Local and Supabase Storage ---
         original_filename_no_ext = os.path.splitext(file.filename)[0]
@@ -110,6 +141,7 @@ def upload_outline_to_storage():
                 db_upload_response = upload_data_supabase(moduleId, processed_data)
                 if db_upload_response:
                     db_upload_success = True
+                    outline_cache.invalidate(moduleId)
                     app.logger.info("Processed data uploaded to Supabase Database successfully.")
                 else:
                     app.logger.error("Failed to upload processed data to Supabase Database.")
@@ -188,11 +220,15 @@ def upload_outline_to_storage():
                 app.logger.warning(f"Local file {local_file_path} not found for deletion or path not set.")
 
 
+    except HTTPException:
+        # e.g. RequestEntityTooLarge while parsing the upload; handled by its error handler
+        raise
     except Exception as e: # This outer catch handles errors before local_file_path is created, or other unhandled exceptions
         app.logger.error("Unhandled error in /process-outline: %s", e, exc_info=True)
         return jsonify({"error": "An internal server error occurred."}), 500
 
 @app.route("/process-ppt", methods=["POST"])
+@admit("ingest")
 def process_slide_pdf():
     try:
         if "file" not in request.files:
@@ -251,32 +287,133 @@ def process_slide_pdf():
             "result": result
         }), 200
 
+    except HTTPException:
+        raise
     except Exception as e:
         app.logger.error("Unhandled error in /process-ppt: %s", e, exc_info=True)
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
     
 
 @app.route("/process-chat", methods=["POST"])
+@admit("chat")
 def process_chat_route():
     data = request.get_json() or {}
     message = data.get("message")
     topic = data.get("topic")
     module_id = data.get("moduleId")
-    chat_history = data.get("chatHistory")
+    session_id = data.get("sessionId")
     if not all([message, topic, module_id]):
-        return jsonify({"error": "Missing message, topic, moduleId, or chatHistory"}), 400
+        return jsonify({"error": "Missing message, topic, or moduleId"}), 400
 
+    # Embedding and searches run while the session is loaded
+    retrieval = start_retrieval(message, topic, module_id, match_count=5)
 
-    print(message, topic, module_id, chat_history)
+    session = session_store.get(session_id) if session_id else None
+    if session is None:
+        session_id = uuid.uuid4().hex
+        session = session_store.create(session_id, topic, module_id)
+        app.logger.info("Created chat session %s for %s/%s", session_id, module_id, topic)
+    elif session["topic"] != topic or session["module_id"] != module_id:
+        return jsonify({"error": "Session belongs to a different module or topic"}), 409
 
+    response = process_chat(message, topic, module_id, session, retrieval=retrieval)
 
-    response = process_chat(message, topic, module_id, chat_history)
-    return jsonify({"answer": response}), 200
+    session_store.append_messages(session_id, [
+        {"role": "user", "text": message},
+        {"role": "assistant", "text": response},
+    ])
+    # Older turns are folded into the running summary off the request path
+    keep_messages = MAX_RECENT_PAIRS * 2
+    if len(session["messages"]) + 2 > keep_messages:
+        history_summarizer.schedule(session_id, keep_messages)
+
+    return jsonify({"answer": response, "sessionId": session_id}), 200
 
     # return Response(
     #     stream_with_context(stream_chat(message, topic, module_id, chat_history)),
     #     mimetype="text/event-stream"
     # )
+
+def cached_json_response(entry):
+    response = Response(entry["body"], mimetype="application/json")
+    response.set_etag(entry["etag"])
+    response.last_modified = entry["last_modified"]
+    # Clients may store the response but must revalidate; unchanged data costs a 304
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route("/modules", methods=["GET"])
+def module_list_route():
+    try:
+        entry = module_list_cache.get(MODULE_LIST_KEY)
+    except Exception as e:
+        app.logger.error("Failed to load modules: %s", e, exc_info=True)
+        return jsonify({"error": "Failed to load modules"}), 500
+    return cached_json_response(entry)
+
+
+@app.route("/modules/<module_id>", methods=["GET"])
+def module_outline_route(module_id):
+    try:
+        entry = outline_cache.get(module_id)
+    except Exception as e:
+        app.logger.error("Failed to load outline for %s: %s", module_id, e, exc_info=True)
+        return jsonify({"error": "Failed to load module outline"}), 500
+
+    if entry is None:
+        return jsonify({"error": "Module not found"}), 404
+    return cached_json_response(entry)
+
+
+def cache_invalidate_authorized() -> bool:
+    header = request.headers.get("Authorization", "")
+    if not CACHE_INVALIDATE_TOKEN or not header.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(header[len("Bearer "):].encode("utf-8"), CACHE_INVALIDATE_TOKEN.encode("utf-8"))
+
+
+@app.route("/modules/<module_id>/invalidate", methods=["POST"])
+def invalidate_module_route(module_id):
+    # Called by the Next.js API routes after they create or delete a module.
+    # Only this worker's caches are cleared; other workers catch up when their entries expire.
+    if not cache_invalidate_authorized():
+        return jsonify({"error": "Not found"}), 404
+    outline_cache.invalidate(module_id)
+    module_list_cache.invalidate(MODULE_LIST_KEY)
+    return jsonify({"message": "Cache invalidated"}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    # Prometheus text format: admission queue depth and rejection counts per pool
+    return Response(metrics_text(), mimetype="text/plain; version=0.0.4")
+
+
+def profile_admin_authorized() -> bool:
+    # Profile admin endpoints are disabled unless PROFILE_TOKEN is set
+    header = request.headers.get("Authorization", "")
+    return header.startswith("Bearer ") and profiler.token_matches(header[len("Bearer "):])
+
+
+@app.route("/admin/profiles", methods=["GET"])
+def list_profiles_route():
+    if not profile_admin_authorized():
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"profiles": profiler.list_profiles()}), 200
+
+
+@app.route("/admin/profiles/<route>/<name>", methods=["GET"])
+def download_profile_route(route, name):
+    if not profile_admin_authorized():
+        return jsonify({"error": "Not found"}), 404
+    path = profiler.profile_path(route, name)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    # Collapsed stacks load directly in speedscope or flamegraph.pl
+    return send_file(os.path.abspath(path), mimetype="text/plain", as_attachment=True, download_name=name)
+
+
 if __name__ == '__main__':
     from dotenv import load_dotenv
     load_dotenv()
@@ -0,0 +1,134 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+
+from admission import AdmissionPool, AdmissionRejected
+
+
+def make_pool(max_concurrent=1, max_queue=4, max_queue_per_module=2, queue_timeout=1.0):
+    return AdmissionPool("test", max_concurrent, max_queue, max_queue_per_module, queue_timeout)
+
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def queue_waiter(pool, module_id, admitted, errors):
+    def run():
+        try:
+            pool.acquire(module_id)
+        except AdmissionRejected as e:
+            errors.append((module_id, e))
+            return
+        admitted.append(module_id)
+        pool.release(0.01)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_admits_up_to_max_concurrent_without_queueing():
+    pool = make_pool(max_concurrent=2)
+    pool.acquire("a")
+    pool.acquire("b")
+    assert pool.queue_depth() == 0
+    assert pool.admitted_total == 2
+
+
+def test_slots_are_handed_out_round_robin_across_modules():
+    pool = make_pool(max_concurrent=1, max_queue=8, max_queue_per_module=4)
+    pool.acquire("busy")
+
+    admitted, errors, threads = [], [], []
+    # Module "a" queues three requests before "b" queues two
+    for module_id in ["a", "a", "a", "b", "b"]:
+        threads.append(queue_waiter(pool, module_id, admitted, errors))
+        wait_for(lambda: pool.queue_depth() == len(threads))
+
+    pool.release(0.01)
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert admitted == ["a", "b", "a", "b", "a"]
+
+
+def test_full_module_queue_is_rejected_with_429():
+    pool = make_pool(max_concurrent=1, max_queue=8, max_queue_per_module=1)
+    pool.acquire("busy")
+    admitted, errors = [], []
+    waiter = queue_waiter(pool, "a", admitted, errors)
+    wait_for(lambda: pool.queue_depth() == 1)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        pool.acquire("a")
+    assert rejected.value.status == 429
+    assert rejected.value.reason == "module_queue_full"
+    assert rejected.value.retry_after >= 1
+    assert pool.rejected_total["module_queue_full"] == 1
+
+    pool.release(0.01)
+    waiter.join()
+    assert admitted == ["a"]
+
+
+def test_full_global_queue_is_rejected_with_503():
+    pool = make_pool(max_concurrent=1, max_queue=2, max_queue_per_module=2)
+    pool.acquire("busy")
+    admitted, errors = [], []
+    waiters = [queue_waiter(pool, m, admitted, errors) for m in ["a", "b"]]
+    wait_for(lambda: pool.queue_depth() == 2)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        pool.acquire("c")
+    assert rejected.value.status == 503
+    assert rejected.value.reason == "queue_full"
+
+    pool.release(0.01)
+    for waiter in waiters:
+        waiter.join()
+    assert sorted(admitted) == ["a", "b"]
+
+
+def test_queue_timeout_removes_the_waiter():
+    pool = make_pool(max_concurrent=1, queue_timeout=0.05)
+    pool.acquire("busy")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        pool.acquire("a")
+    assert rejected.value.status == 503
+    assert rejected.value.reason == "queue_timeout"
+    assert pool.queue_depth() == 0
+    assert "a" not in pool._turns
+
+    # The freed slot goes to a new request instead of the timed-out one
+    pool.release(0.01)
+    pool.acquire("b")
+    assert pool.admitted_total == 2
+
+
+def test_retry_after_grows_with_backlog_and_service_time():
+    pool = make_pool(max_concurrent=1, max_queue=8, max_queue_per_module=8)
+    pool.acquire("busy")
+    for _ in range(20):
+        pool.release(4.0)
+        pool.acquire("busy")
+    empty_queue = pool._retry_after()
+    assert empty_queue >= 3
+
+    admitted, errors = [], []
+    waiters = [queue_waiter(pool, "a", admitted, errors) for _ in range(3)]
+    wait_for(lambda: pool.queue_depth() == 3)
+    assert pool._retry_after() > empty_queue
+
+    pool.release(0.01)
+    for waiter in waiters:
+        waiter.join()
+    assert admitted == ["a", "a", "a"]
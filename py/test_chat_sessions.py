@@ -0,0 +1,100 @@
+import time
+import threading
+
+import pytest
+
+from chat_sessions import InMemorySessionStore, SQLiteSessionStore, HistorySummarizer
+
+
+def turns(*texts):
+    return [{"role": "user", "text": t} for t in texts]
+
+
+def texts(session):
+    return [m["text"] for m in session["messages"]]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"))
+
+
+def test_fold_keeps_messages_appended_after_the_read(store):
+    store.create("s", "topic", "module")
+    store.append_messages("s", turns("0", "1", "2"))
+    read = store.get("s")
+
+    # A new turn arrives while the summary is being generated
+    store.append_messages("s", turns("3"))
+    assert store.fold_summary("s", "summary of 0-1", 2, read["summary_version"])
+
+    session = store.get("s")
+    assert session["summary"] == "summary of 0-1"
+    assert texts(session) == ["2", "3"]
+
+
+def test_stale_fold_is_rejected(store):
+    store.create("s", "topic", "module")
+    store.append_messages("s", turns("0", "1", "2", "3", "4", "5"))
+
+    # Two workers read the same version; A folds first
+    read_a = store.get("s")
+    read_b = store.get("s")
+    assert store.fold_summary("s", "A: 0-1", 2, read_a["summary_version"])
+    assert not store.fold_summary("s", "B: 0-3", 4, read_b["summary_version"])
+
+    session = store.get("s")
+    assert session["summary"] == "A: 0-1"
+    assert texts(session) == ["2", "3", "4", "5"]
+
+    # A fold based on a fresh read applies
+    read = store.get("s")
+    assert store.fold_summary("s", "0-3", 2, read["summary_version"])
+    assert texts(store.get("s")) == ["4", "5"]
+
+
+def test_sqlite_fold_is_checked_across_connections(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = SQLiteSessionStore(path), SQLiteSessionStore(path)
+    worker_a.create("s", "topic", "module")
+    worker_a.append_messages("s", turns("0", "1", "2", "3", "4", "5"))
+
+    read_a, read_b = worker_a.get("s"), worker_b.get("s")
+    assert worker_a.fold_summary("s", "A", 2, read_a["summary_version"])
+    assert not worker_b.fold_summary("s", "B", 4, read_b["summary_version"])
+    worker_b.append_messages("s", turns("6"))
+
+    assert texts(worker_a.get("s")) == ["2", "3", "4", "5", "6"]
+
+
+def test_expired_sessions_are_dropped(tmp_path):
+    for store in (InMemorySessionStore(ttl=0.05), SQLiteSessionStore(str(tmp_path / "s.db"), ttl=0.05)):
+        store.create("s", "topic", "module")
+        time.sleep(0.1)
+        assert store.get("s") is None
+        # Late writes to an expired session are ignored
+        store.append_messages("s", turns("x"))
+        assert not store.fold_summary("s", "summary", 1, 0)
+
+
+def test_summarizer_folds_overflow(store):
+    store.create("s", "topic", "module")
+    store.append_messages("s", turns(*[str(i) for i in range(6)]))
+    done = threading.Event()
+
+    def summarize(previous, messages):
+        done.set()
+        return previous + "".join(m["text"] for m in messages)
+
+    HistorySummarizer(store, summarize).schedule("s", keep_messages=4)
+    assert done.wait(1)
+    for _ in range(100):
+        session = store.get("s")
+        if session["summary"]:
+            break
+        time.sleep(0.01)
+
+    assert session["summary"] == "01"
+    assert texts(session) == ["2", "3", "4", "5"]
@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+for dependency in ("groq", "supabase", "langchain_groq", "langchain_huggingface", "langchain_community"):
+    pytest.importorskip(dependency)
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+import process_chat
+
+
+def docs(prefix, count):
+    return [{"chunk": f"{prefix}{i}"} for i in range(count)]
+
+
+def delayed(delay, result=None, error=None):
+    def search(*args):
+        time.sleep(delay)
+        if error:
+            raise error
+        return result
+    return search
+
+
+@pytest.fixture(scope="module", autouse=True)
+def executor():
+    process_chat.init_retrieval(max_workers=8)
+    yield
+    process_chat.retrieval_executor.shutdown(wait=False, cancel_futures=True)
+
+
+@pytest.fixture(autouse=True)
+def short_budgets(monkeypatch):
+    monkeypatch.setattr(process_chat, "RETRIEVAL_TIMEOUT", 1.0)
+    monkeypatch.setattr(process_chat, "KEYWORD_FALLBACK_AFTER", 0.5)
+
+
+def collect(monkeypatch, hybrid, keyword):
+    monkeypatch.setattr(process_chat, "hybrid_search", hybrid)
+    monkeypatch.setattr(process_chat, "keyword_search", keyword)
+    started = time.monotonic()
+    result = process_chat.collect_context(process_chat.start_retrieval("q", "topic", "module", match_count=5))
+    return result, time.monotonic() - started
+
+
+def test_hybrid_error_falls_back_to_keyword(monkeypatch):
+    result, elapsed = collect(
+        monkeypatch,
+        delayed(0, error=RuntimeError("rpc failed")),
+        delayed(0.1, docs("k", 5)),
+    )
+    assert result == docs("k", 5)
+    assert elapsed < 0.5
+
+
+def test_hybrid_empty_falls_back_to_keyword(monkeypatch):
+    result, elapsed = collect(monkeypatch, delayed(0.1, None), delayed(0.2, docs("k", 5)))
+    assert result == docs("k", 5)
+    assert elapsed < 0.5
+
+
+def test_hybrid_slow_uses_keyword_after_fallback_delay(monkeypatch):
+    result, elapsed = collect(monkeypatch, delayed(3, docs("h", 5)), delayed(0, docs("k", 5)))
+    assert result == docs("k", 5)
+    assert 0.5 <= elapsed < 1.0
+
+
+def test_hybrid_results_preferred_and_topped_up(monkeypatch):
+    result, _ = collect(monkeypatch, delayed(0.1, docs("h", 3)), delayed(0, docs("k", 5)))
+    assert result == docs("h", 3) + docs("k", 2)
+
+
+def test_deadline_returns_partial_context(monkeypatch):
+    result, elapsed = collect(monkeypatch, delayed(3, docs("h", 5)), delayed(0, docs("k", 1)))
+    assert result == docs("k", 1)
+    assert 1.0 <= elapsed < 1.5